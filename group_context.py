@@ -1,28 +1,112 @@
 import aiosqlite
 import json
 import logging
+import sys
+from array import array
+from dataclasses import dataclass
 from datetime import datetime
-from collections import defaultdict, deque
+from functools import cached_property
 from typing import Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
+
+class _MessageRing:
+    """
+    Кольцевой буфер сообщений в колоночном виде (SoA)
+
+    Флаги is_bot лежат в array('b') — 1 байт на слот вместо ссылки на
+    PyObject bool, id пользователей — в array('q'). Заменяет deque со
+    словарём на каждое сообщение.
+    """
+
+    __slots__ = ("capacity", "size", "head", "user_ids", "user_names",
+                 "texts", "timestamps", "is_bot")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.size = 0
+        self.head = 0  # Позиция следующей записи
+        self.user_ids = array('q', bytes(8 * capacity))
+        self.user_names: List[Optional[str]] = [None] * capacity
+        self.texts: List[Optional[str]] = [None] * capacity
+        self.timestamps: List[Optional[str]] = [None] * capacity
+        self.is_bot = array('b', bytes(capacity))
+
+    def append(self, user_id: int, user_name: str, text: str,
+               timestamp: str, is_bot: bool):
+        i = self.head
+        self.user_ids[i] = user_id
+        self.user_names[i] = user_name
+        self.texts[i] = text
+        self.timestamps[i] = timestamp
+        self.is_bot[i] = 1 if is_bot else 0
+        self.head = (i + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        """Отдаёт сообщения в хронологическом порядке (старые -> новые)"""
+        start = (self.head - self.size) % self.capacity
+        for k in range(self.size):
+            i = (start + k) % self.capacity
+            yield {
+                "user_id": self.user_ids[i],
+                "user_name": self.user_names[i],
+                "text": self.texts[i],
+                "timestamp": self.timestamps[i],
+                "is_bot": bool(self.is_bot[i])
+            }
+
+
+@dataclass
+class CombinedContext:
+    """Контекст для ответа: полная строка склеивается лениво, по обращению"""
+    user_context: str
+    chat_context: str
+
+    @cached_property
+    def full_context(self) -> str:
+        if self.user_context or self.chat_context:
+            return f"{self.user_context}\n\n{self.chat_context}"
+        return ""
+
+    def __getitem__(self, key):
+        # Совместимость со старыми вызовами вида context_data["full_context"]
+        return getattr(self, key)
+
+def _snip(s: str, n: int = 100) -> str:
+    """Обрезает строку до n символов; короткие строки возвращает как есть (без копии)"""
+    return s if len(s) <= n else s[:n] + '…'
+
 class GroupContextManager:
     """Менеджер контекста для групповых чатов"""
     
-    def __init__(self, db_path="group_memory.db", max_history_per_user=10):
+    def __init__(self, db_path="group_memory.db", max_history_per_user=10,
+                 max_chats=2048):
         self.db_path = db_path
         self.max_history_per_user = max_history_per_user
-        # Формат: self.user_history[chat_id][user_id] = deque(...)
-        self.user_history = defaultdict(lambda: defaultdict(
-            lambda: deque(maxlen=max_history_per_user)
-        ))
+        self.max_chats = max_chats
+        # Формат: self.user_history[chat_id][user_id] = _MessageRing(...)
+        # Явные dict вместо вложенных defaultdict(lambda: ...): нет вызова
+        # closure на каждый промах и число чатов ограничено (max_chats)
+        self.user_history: Dict[int, Dict[int, _MessageRing]] = {}
         # Общая история чата (последние N сообщений)
-        self.chat_history = defaultdict(lambda: deque(maxlen=30))
+        self.chat_history: Dict[int, _MessageRing] = {}
         
     async def init_db(self):
         """Инициализация базы данных"""
         async with aiosqlite.connect(self.db_path) as db:
+            # WAL + NORMAL: см. memory.init_db — дешёвые коммиты,
+            # конкурентное чтение при записи
+            await db.execute("PRAGMA journal_mode=WAL")
+            await db.execute("PRAGMA synchronous=NORMAL")
+            await db.execute("PRAGMA temp_store=MEMORY")
+            await db.execute("PRAGMA mmap_size=268435456")
+
             # Таблица для долгосрочной памяти о пользователях в чатах
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS chat_user_memory (
@@ -60,25 +144,40 @@ class GroupContextManager:
             is_bot_response: Это ответ бота?
         """
         timestamp = datetime.now().isoformat()
-        
+
+        # Имя пользователя повторяется в каждой записи истории — интернируем,
+        # чтобы все записи ссылались на один и тот же объект строки
+        if len(user_name) < 64:
+            user_name = sys.intern(user_name)
+
+        chat_users = self.user_history.get(chat_id)
+        if chat_users is None:
+            if len(self.user_history) >= self.max_chats:
+                self._evict_oldest_chat()
+            chat_users = self.user_history[chat_id] = {}
+            self.chat_history[chat_id] = _MessageRing(30)
+
+        user_ring = chat_users.get(user_id)
+        if user_ring is None:
+            user_ring = chat_users[user_id] = _MessageRing(self.max_history_per_user)
+
         # Сохраняем в историю пользователя
-        self.user_history[chat_id][user_id].append({
-            "text": message,
-            "timestamp": timestamp,
-            "is_bot": is_bot_response
-        })
-        
+        user_ring.append(user_id, user_name, message, timestamp, is_bot_response)
+
         # Сохраняем в общую историю чата
-        self.chat_history[chat_id].append({
-            "user_id": user_id,
-            "user_name": user_name,
-            "text": message,
-            "timestamp": timestamp,
-            "is_bot": is_bot_response
-        })
+        self.chat_history[chat_id].append(
+            user_id, user_name, message, timestamp, is_bot_response
+        )
         
         logger.debug(f"💬 [{chat_id}] Сообщение от {user_name} ({user_id}) сохранено")
-    
+
+    def _evict_oldest_chat(self):
+        """Удаляет самый старый чат, чтобы память не росла бесконечно"""
+        oldest_chat_id = next(iter(self.user_history))
+        self.user_history.pop(oldest_chat_id, None)
+        self.chat_history.pop(oldest_chat_id, None)
+        logger.debug(f"🧹 Чат {oldest_chat_id} вытеснен из контекста (лимит {self.max_chats})")
+
     def get_user_context(self, chat_id: int, user_id: int, 
                          max_messages: int = 5) -> str:
         """
@@ -87,17 +186,16 @@ class GroupContextManager:
         Returns:
             Строка с историей диалога пользователя
         """
-        if user_id not in self.user_history[chat_id]:
-            return ""
-        
-        history = list(self.user_history[chat_id][user_id])
-        if not history:
+        user_ring = self.user_history.get(chat_id, {}).get(user_id)
+        if not user_ring:
             return ""
+
+        history = list(user_ring)
         
         context_lines = ["📝 **История вашего общения со мной:**"]
         for msg in history[-max_messages:]:
             role = "Я" if msg["is_bot"] else "Вы"
-            context_lines.append(f"{role}: {msg['text'][:100]}...")
+            context_lines.append(f"{role}: {_snip(msg['text'])}")
         
         return "\n".join(context_lines)
     
@@ -115,7 +213,7 @@ class GroupContextManager:
         Returns:
             Строка с историей чата
         """
-        history = list(self.chat_history[chat_id])
+        history = list(self.chat_history.get(chat_id, ()))
         if not history:
             return ""
         
@@ -133,33 +231,45 @@ class GroupContextManager:
             name = msg["user_name"]
             if msg["is_bot"]:
                 name = f"🤖 {name}"
-            context_lines.append(f"{name}: {msg['text'][:100]}...")
+            context_lines.append(f"{name}: {_snip(msg['text'])}")
         
         return "\n".join(context_lines)
     
-    def get_combined_context(self, chat_id: int, user_id: int, 
-                             user_name: str, current_message: str) -> Dict:
+    def get_combined_context(self, chat_id: int, user_id: int,
+                             user_name: str, current_message: str) -> CombinedContext:
         """
         Формирует полный контекст для ответа
-        
+
         Returns:
-            Словарь с различными частями контекста
+            CombinedContext; full_context склеивается только если его прочитали
         """
         user_context = self.get_user_context(chat_id, user_id)
         chat_context = self.get_chat_context(chat_id, exclude_user_id=user_id)
-        
+
         # Добавляем текущее сообщение в историю
         self.add_message(chat_id, user_id, user_name, current_message)
-        
-        return {
-            "user_context": user_context,
-            "chat_context": chat_context,
-            "full_context": f"{user_context}\n\n{chat_context}" if user_context or chat_context else ""
-        }
+
+        return CombinedContext(user_context, chat_context)
     
-    async def save_user_info(self, chat_id: int, user_id: int, 
-                              user_info: dict, facts: dict = None):
-        """Сохраняет информацию о пользователе в БД"""
+    @staticmethod
+    def _to_json(value) -> Optional[str]:
+        """Сериализует значение в JSON; уже сериализованные блобы пропускает как есть"""
+        if value is None:
+            return None
+        if isinstance(value, (bytes, bytearray)):
+            return value.decode('utf-8')
+        if isinstance(value, str):
+            return value
+        return json.dumps(value, ensure_ascii=False)
+
+    async def save_user_info(self, chat_id: int, user_id: int,
+                              user_info, facts=None):
+        """
+        Сохраняет информацию о пользователе в БД
+
+        user_info/facts могут быть dict либо уже сериализованным JSON
+        (str/bytes) — тогда повторная сериализация не выполняется.
+        """
         async with aiosqlite.connect(self.db_path) as db:
             await db.execute('''
                 INSERT INTO chat_user_memory (chat_id, user_id, user_info, facts, last_seen, message_count)
@@ -171,8 +281,8 @@ class GroupContextManager:
                     last_seen = excluded.last_seen,
                     message_count = message_count + 1
             ''', (
-                chat_id, user_id, json.dumps(user_info, ensure_ascii=False),
-                json.dumps(facts, ensure_ascii=False) if facts else None,
+                chat_id, user_id, self._to_json(user_info),
+                self._to_json(facts),
                 datetime.now().isoformat(), chat_id, user_id
             ))
             await db.commit()
@@ -1,11 +1,20 @@
 import aiosqlite
 import json
 import logging
+import re
 from datetime import datetime, timedelta
 from collections import deque
 
 logger = logging.getLogger(__name__)
 
+# Один скомпилированный проход по сообщению вместо цепочки lower/in/split/find
+_FACT_RE = re.compile(
+    r"меня зовут\s+(?P<name>\w+)"
+    r"|(?:я из|живу в)\s+(?P<city>\w+)"
+    r"|(?:люблю|нравится|увлекаюсь|работаю)\s+(?P<interest>[^.,!?]+)",
+    re.IGNORECASE
+)
+
 class BotMemory:
     """Класс для управления памятью бота"""
     
@@ -17,6 +26,13 @@ class BotMemory:
     async def init_db(self):
         """Инициализация базы данных"""
         async with aiosqlite.connect(self.db_path) as db:
+            # WAL + NORMAL: без fsync на каждый commit, читатели не блокируют
+            # писателя. Потеря пары последних секунд при падении — приемлемо
+            await db.execute("PRAGMA journal_mode=WAL")
+            await db.execute("PRAGMA synchronous=NORMAL")
+            await db.execute("PRAGMA temp_store=MEMORY")
+            await db.execute("PRAGMA mmap_size=268435456")
+
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS user_memory (
                     user_id INTEGER PRIMARY KEY,
@@ -72,35 +88,50 @@ class BotMemory:
         
         return "\n".join(context_lines)
     
+    _UPSERT_FACTS_SQL = '''
+        INSERT INTO user_memory (user_id, facts, last_seen, total_messages)
+        VALUES (?, ?, ?, COALESCE((SELECT total_messages FROM user_memory WHERE user_id = ?), 0) + 1)
+        ON CONFLICT(user_id) DO UPDATE SET
+            facts = excluded.facts,
+            last_seen = excluded.last_seen,
+            total_messages = total_messages + 1
+    '''
+
     async def remember_fact(self, user_id: int, fact_key: str, fact_value: str):
-        """Запоминает факт о пользователе"""
+        """Запоминает один факт о пользователе"""
+        await self.remember_facts(user_id, {fact_key: fact_value})
+
+    async def remember_facts(self, user_id: int, new_facts: dict):
+        """Запоминает несколько фактов одной транзакцией (один commit на пачку)"""
+        if not new_facts:
+            return
+
         async with aiosqlite.connect(self.db_path) as db:
             cursor = await db.execute(
                 "SELECT facts FROM user_memory WHERE user_id = ?",
                 (user_id,)
             )
             row = await cursor.fetchone()
-            
+
             facts = {}
             if row and row[0]:
                 facts = json.loads(row[0])
-            
-            facts[fact_key] = {
-                "value": fact_value,
-                "updated": datetime.now().isoformat()
-            }
-            
-            await db.execute('''
-                INSERT INTO user_memory (user_id, facts, last_seen, total_messages)
-                VALUES (?, ?, ?, COALESCE((SELECT total_messages FROM user_memory WHERE user_id = ?), 0) + 1)
-                ON CONFLICT(user_id) DO UPDATE SET
-                    facts = excluded.facts,
-                    last_seen = excluded.last_seen,
-                    total_messages = total_messages + 1
-            ''', (user_id, json.dumps(facts), datetime.now().isoformat(), user_id))
-            
+
+            now = datetime.now().isoformat()
+            for fact_key, fact_value in new_facts.items():
+                facts[fact_key] = {
+                    "value": fact_value,
+                    "updated": now
+                }
+
+            await db.execute(
+                self._UPSERT_FACTS_SQL,
+                (user_id, json.dumps(facts), now, user_id)
+            )
+
             await db.commit()
-            logger.info(f"🧠 Запомнил факт о {user_id}: {fact_key} = {fact_value}")
+            for fact_key, fact_value in new_facts.items():
+                logger.info(f"🧠 Запомнил факт о {user_id}: {fact_key} = {fact_value}")
     
     async def get_user_facts(self, user_id: int) -> dict:
         """Возвращает все сохраненные факты о пользователе"""
@@ -116,31 +147,22 @@ class BotMemory:
             return {}
     
     async def extract_facts_from_message(self, user_id: int, message: str):
-        """Пытается извлечь факты из сообщения пользователя"""
-        message_lower = message.lower()
-        
-        if "меня зовут" in message_lower:
-            parts = message_lower.split("меня зовут")
-            if len(parts) > 1:
-                name = parts[1].strip().split()[0].capitalize()
-                await self.remember_fact(user_id, "name", name)
-        
-        if "я из" in message_lower or "живу в" in message_lower:
-            words = message_lower.split()
-            for i, word in enumerate(words):
-                if word in ["из", "в"] and i + 1 < len(words):
-                    city = words[i + 1].strip(".,!?").capitalize()
-                    if len(city) > 2:
-                        await self.remember_fact(user_id, "city", city)
-        
-        interests = ["люблю", "нравится", "увлекаюсь", "работаю"]
-        for interest in interests:
-            if interest in message_lower:
-                idx = message_lower.find(interest) + len(interest)
-                if idx < len(message_lower):
-                    topic = message[idx:].split('.')[0].split(',')[0].strip()
-                    if len(topic) > 3:
-                        await self.remember_fact(user_id, "interest", topic)
+        """Пытается извлечь факты из сообщения пользователя (один проход regex)"""
+        found = {}
+        for m in _FACT_RE.finditer(message):
+            kind = m.lastgroup
+            value = m.group(kind).strip()
+
+            if kind == "name":
+                found["name"] = value.capitalize()
+            elif kind == "city":
+                if len(value) > 2:
+                    found["city"] = value.capitalize()
+            elif kind == "interest":
+                if len(value) > 3:
+                    found["interest"] = value
+
+        await self.remember_facts(user_id, found)
     
     async def get_user_context(self, user_id: int) -> str:
         """Формирует контекст из долгосрочной памяти"""
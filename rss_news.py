@@ -1,7 +1,12 @@
 import feedparser
 import aiohttp
 import asyncio
+import calendar
+import hashlib
 import logging
+import operator
+import sys
+import time
 from typing import List, Dict, Optional
 from datetime import datetime
 import html
@@ -90,6 +95,11 @@ class RSSNewsEngine:
         self.queries_today = 0
         self.max_daily = 1000  # Условный лимит, на самом деле безлимитно
         self.last_reset = datetime.now().date()
+
+        # Кэш распарсенных лент: если тело RSS не изменилось (тот же хэш),
+        # не гоняем feedparser повторно — это основная CPU-стоимость опроса
+        self._body_hash: Dict[str, str] = {}
+        self._parsed_cache: Dict[str, list] = {}
     
     def _check_limits(self) -> bool:
         """Проверка дневного лимита (для совместимости)"""
@@ -121,7 +131,46 @@ class RSSNewsEngine:
                 return published[:16]
         except:
             return published[:10]
-    
+
+    @staticmethod
+    def _entry_timestamp(entry) -> float:
+        """Возвращает время публикации записи как epoch (для числовой сортировки)"""
+        parsed = entry.get('published_parsed') or entry.get('updated_parsed')
+        if parsed:
+            try:
+                return calendar.timegm(parsed)
+            except (TypeError, ValueError):
+                pass
+        return time.time()
+
+    async def _fetch_body(self, url: str) -> Optional[bytes]:
+        """Скачивает тело RSS-ленты (асинхронно, без блокировки event loop)"""
+        timeout = aiohttp.ClientTimeout(total=15)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.get(url) as response:
+                if response.status != 200:
+                    return None
+                return await response.read()
+
+    async def _get_entries(self, src_key: str, url: str) -> list:
+        """Возвращает записи ленты, переиспользуя кэш при неизменном теле"""
+        body = await self._fetch_body(url)
+        if body is None:
+            return []
+
+        body_hash = hashlib.md5(body).hexdigest()
+        if self._body_hash.get(src_key) == body_hash:
+            logger.debug(f"♻️ RSS {src_key}: тело не изменилось, без повторного парсинга")
+            return self._parsed_cache[src_key]
+
+        # Парсим RSS (feedparser синхронный, запускаем в потоке)
+        loop = asyncio.get_event_loop()
+        feed = await loop.run_in_executor(None, feedparser.parse, body)
+
+        self._body_hash[src_key] = body_hash
+        self._parsed_cache[src_key] = feed.entries
+        return feed.entries
+
     async def get_latest_news(self, source: str = "all", limit: int = 5) -> List[Dict]:
         """
         Получает последние новости из указанных источников
@@ -147,19 +196,14 @@ class RSSNewsEngine:
                 
             try:
                 logger.info(f"📡 Читаю RSS: {src_info['name']}")
-                
-                # Парсим RSS (feedparser синхронный, запускаем в потоке)
-                loop = asyncio.get_event_loop()
-                feed = await loop.run_in_executor(
-                    None, 
-                    lambda: feedparser.parse(src_info['url'])
-                )
-                
-                if not feed.entries:
+
+                entries = await self._get_entries(src_key, src_info['url'])
+
+                if not entries:
                     logger.warning(f"⚠️ Пустой RSS: {src_info['name']}")
                     continue
-                
-                for entry in feed.entries[:3]:  # Берем по 3 из каждого источника
+
+                for entry in entries[:3]:  # Берем по 3 из каждого источника
                     # Очищаем HTML из заголовка
                     title = html.unescape(entry.get('title', 'Без названия'))
                     title = re.sub('<[^<]+?>', '', title)
@@ -180,8 +224,10 @@ class RSSNewsEngine:
                         "content": summary,
                         "url": link,
                         "date": date,
-                        "source": src_info['name'],
-                        "source_key": src_key,
+                        "_ts": self._entry_timestamp(entry),
+                        # Название источника одно на все его новости — интернируем
+                        "source": sys.intern(src_info['name']),
+                        "source_key": sys.intern(src_key),
                         "is_russian": True
                     })
                     
@@ -189,8 +235,9 @@ class RSSNewsEngine:
                 logger.error(f"❌ Ошибка RSS {src_info.get('name', src_key)}: {e}")
                 continue
         
-        # Сортируем по дате (свежие сверху)
-        results.sort(key=lambda x: x['date'], reverse=True)
+        # Сортируем по дате (свежие сверху): числовое сравнение epoch-меток,
+        # строка "dd.mm.YYYY" сортировалась бы лексикографически (сначала по дню)
+        results.sort(key=operator.itemgetter('_ts'), reverse=True)
         
         self.queries_today += 1
         logger.info(f"✅ RSS: собрано {len(results)} новостей")
@@ -230,32 +277,33 @@ class RSSNewsEngine:
         if not results:
             return "📰 Новостей не найдено."
         
+        # Собираем куски в список и склеиваем одним join —
+        # без повторных реаллокаций растущей строки
         if query:
-            message = f"📰 **Новости по запросу:**\n"
-            message += f"_{query}_\n\n"
+            parts = [f"📰 **Новости по запросу:**\n", f"_{query}_\n\n"]
         else:
-            message = f"📰 **Свежие новости:**\n\n"
-        
+            parts = [f"📰 **Свежие новости:**\n\n"]
+
         for i, item in enumerate(results, 1):
             title = item.get('title', 'Без названия')
             source = item.get('source', 'Новости')
             date = item.get('date', '')
             url = item.get('url', '')
-            
-            message += f"**{i}. 🇷🇺 {title}**\n"
-            message += f"📰 {source}"
+
+            parts.append(f"**{i}. 🇷🇺 {title}**\n")
+            parts.append(f"📰 {source}")
             if date:
-                message += f" 📅 {date}"
-            message += "\n"
-            
+                parts.append(f" 📅 {date}")
+            parts.append("\n")
+
             if item.get('content'):
-                message += f"_{item['content']}_\n"
-            
+                parts.append(f"_{item['content']}_\n")
+
             if url:
-                message += f"🔗 [Читать]({url})\n"
-            message += "\n"
-        
-        return message.strip()
+                parts.append(f"🔗 [Читать]({url})\n")
+            parts.append("\n")
+
+        return "".join(parts).strip()
     
     def get_sources_list(self) -> str:
         """Возвращает список доступных источников"""
@@ -1,128 +1,525 @@
+import asyncio
+import copy
+import json
 import os
 import logging
+import re
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
 from typing import List, Dict, Optional
 from datetime import datetime
+from urllib.parse import urlsplit
 from tavily import TavilyClient
 
+# Транзиентные сетевые исключения HTTP-клиента tavily (requests в старых
+# версиях библиотеки, httpx в новых) — только их имеет смысл ретраить
+_TRANSIENT_EXC: tuple = ()
+_HTTP_STATUS_EXC: tuple = ()
+try:
+    import requests as _requests
+    _TRANSIENT_EXC += (_requests.ConnectionError, _requests.Timeout)
+    _HTTP_STATUS_EXC += (_requests.HTTPError,)
+except ImportError:
+    pass
+try:
+    import httpx as _httpx
+    _TRANSIENT_EXC += (_httpx.TransportError,)
+    _HTTP_STATUS_EXC += (_httpx.HTTPStatusError,)
+except ImportError:
+    pass
+
 logger = logging.getLogger(__name__)
 
+# Таблица классификации букв: кириллица -> 'R', латиница -> 'E'.
+# Оба регистра включены сразу, так что отдельный .lower() по символу не нужен
+_CYRILLIC = "абвгдеёжзийклмнопрстуфхцчшщъыьэюя"
+_LATIN = "abcdefghijklmnopqrstuvwxyz"
+_LANG_TABLE = str.maketrans(dict(
+    [(c, 'R') for c in _CYRILLIC + _CYRILLIC.upper()] +
+    [(c, 'E') for c in _LATIN + _LATIN.upper()]
+))
+
+@lru_cache(maxsize=4096)
+def _format_pub_date(published: str) -> str:
+    """ISO-дата публикации -> 'dd.mm.YYYY HH:MM' (кэшируется по строке)"""
+    if not published:
+        return ""
+    try:
+        pub_date = datetime.fromisoformat(published.replace('Z', '+00:00'))
+        return pub_date.strftime("%d.%m.%Y %H:%M")
+    except ValueError:
+        return published[:10]
+
+
+# Белый список русскоязычных доменов — строится один раз при импорте
+_RUSSIAN_DOMAINS = (
+    # Новостные агентства
+    "ria.ru", "tass.ru", "interfax.ru", "rbc.ru", "kommersant.ru",
+    "vedomosti.ru", "gazeta.ru", "lenta.ru", "news.ru", "mk.ru",
+    "kp.ru", "aif.ru", "fontanka.ru", "dp.ru", "spb.ru",
+    "echo.msk.ru", "svoboda.org", "currenttime.tv",
+    "meduza.io", "novayagazeta.eu", "istories.media",
+    "the-village.ru", "paperpaper.ru", "bumaga.ru",
+
+    # Поисковики и порталы
+    "yandex.ru", "mail.ru", "rambler.ru", "ya.ru",
+
+    # IT и технологии
+    "habr.com", "habr.ru", "vc.ru", "tjournal.ru", "dtf.ru",
+    "ixbt.com", "overclockers.ru", "3dnews.ru",
+
+    # Спорт
+    "sports.ru", "championat.com", "sovsport.ru",
+
+    # Региональные
+    "msk.ru", "spb.ru", "nn.ru", "eka.ru", "ufa.ru"
+)
+_DOMAIN_SUFFIXES = frozenset(_RUSSIAN_DOMAINS)
+
+# Слова для определения русского языка (нижний регистр; матчатся
+# компилированным regex — нужна подстрочная семантика: "рубль" в "рублям")
+_RUSSIAN_WORDS = (
+    "что", "как", "так", "все", "это", "они", "мы", "вы", "ты",
+    "россия", "москва", "питер", "спб", "российской", "российский",
+    "президент", "путин", "правительство", "госдума", "совет",
+    "рубль", "доллар", "евро", "нефть", "газ", "бензин",
+    "новости", "события", "происшествия", "политика", "экономика",
+    "спорт", "культура", "технологии", "наука", "образование",
+    "сегодня", "вчера", "завтра", "сейчас", "после", "потом",
+    "год", "месяц", "день", "неделя", "часы", "минуты",
+    "человек", "люди", "город", "страна", "мир", "регион"
+)
+_WORDS_RE = re.compile("|".join(re.escape(w) for w in _RUSSIAN_WORDS))
+
+# Горячие строки форматтеров — один объект на модуль вместо
+# пересоздания литералов при каждом рендере
+_FLAG_RU = "🇷🇺 "
+_FLAG_OTHER = "🇬🇧 "
+_TITLE_EMPTY = "Без названия"
+
+
 class TavilySearchEngine:
     """Поисковый движок на базе Tavily API"""
     
-    def __init__(self):
+    def __init__(self, filter_russian: bool = True):
         self.client = None
+        # Приоритизировать ли русскоязычные результаты; False даёт
+        # языконезависимый поиск без переупорядочивания выдачи
+        self.filter_russian = filter_russian
         self.monthly_queries = 0
         self.max_monthly = 1000
         self.last_reset = datetime.now()
+        # Месяц сброса дублируем как int: _check_limits дёргается на каждый
+        # запрос, сравнение двух int дешевле прохода self.last_reset.month
+        self._last_reset_month = self.last_reset.month
+
+        # Защита от залпового сжигания квоты: дневной лимит
+        # (месячный × пиковые дни / 30) и скользящее окно на минуту
+        self.daily_queries = 0
+        self.daily_peak_days = 3
+        self.last_day = self.last_reset.date()
+        self.max_per_minute = 10
+        self.minute_bucket = deque()
+
+        # Счётчики квоты переживают рестарт бота (иначе каждый деплой
+        # "возвращал" месячный лимит)
+        self.state_path = "tavily_state.json"
+
+        # Кэш готовых ответов (TTL) и карта запросов "в полёте":
+        # одинаковые параллельные запросы делят один вызов Tavily,
+        # а повторные в пределах TTL вообще не ходят в сеть
+        self._cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._cache_ttl = 600
+        self._cache_max = 512
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+
+        # Семантический кэш: эмбеддинги нормализованных запросов, чтобы
+        # перефразировки ("курс доллара" / "сколько стоит доллар") находили
+        # уже готовый ответ. Работает только если установлен
+        # sentence-transformers — иначе тихо отключён
+        self._embedder = None
+        self._sem_entries: list = []  # (вектор, ключ кэша)
+        self._sem_max = 512
+        self._sem_threshold = 0.92
+        # Микробатчинг эмбеддингов: параллельные запросы накапливаются и
+        # кодируются одним forward-проходом модели
+        self._embed_pending: list = []
+        self._embed_lock = asyncio.Lock()
+
+        # Кэш отрендеренных сообщений: повторный рендер того же ответа
+        # (например, кэш-попадание поиска) — это один lookup по ключу
+        self._format_cache: "OrderedDict[tuple, str]" = OrderedDict()
+        self._format_cache_max = 256
         
-        # Белый список русскоязычных доменов
-        self.russian_domains = [
-            # Новостные агентства
-            "ria.ru", "tass.ru", "interfax.ru", "rbc.ru", "kommersant.ru",
-            "vedomosti.ru", "gazeta.ru", "lenta.ru", "news.ru", "mk.ru",
-            "kp.ru", "aif.ru", "fontanka.ru", "dp.ru", "spb.ru",
-            "echo.msk.ru", "svoboda.org", "currenttime.tv",
-            "meduza.io", "novayagazeta.eu", "istories.media",
-            "the-village.ru", "paperpaper.ru", "bumaga.ru",
-            
-            # Поисковики и порталы
-            "yandex.ru", "mail.ru", "rambler.ru", "ya.ru",
-            
-            # IT и технологии
-            "habr.com", "habr.ru", "vc.ru", "tjournal.ru", "dtf.ru",
-            "ixbt.com", "overclockers.ru", "3dnews.ru",
-            
-            # Спорт
-            "sports.ru", "championat.com", "sovsport.ru",
-            
-            # Региональные
-            "msk.ru", "spb.ru", "nn.ru", "eka.ru", "ufa.ru"
-        ]
-        
-        # Слова для определения русского языка
-        self.russian_words = [
-            "что", "как", "так", "все", "это", "они", "мы", "вы", "ты",
-            "россия", "москва", "питер", "спб", "российской", "российский",
-            "президент", "путин", "правительство", "госдума", "совет",
-            "рубль", "доллар", "евро", "нефть", "газ", "бензин",
-            "новости", "события", "происшествия", "политика", "экономика",
-            "спорт", "культура", "технологии", "наука", "образование",
-            "сегодня", "вчера", "завтра", "сейчас", "после", "потом",
-            "год", "месяц", "день", "неделя", "часы", "минуты",
-            "человек", "люди", "город", "страна", "мир", "регион"
-        ]
-    
-    def initialize(self, api_key: str):
+        # Ссылки на общие константы модуля (совместимость со старыми
+        # обращениями через экземпляр)
+        self.russian_domains = _RUSSIAN_DOMAINS
+        self.russian_words = _RUSSIAN_WORDS
+        self._domain_suffixes = _DOMAIN_SUFFIXES
+        self._words_re = _WORDS_RE
+        # Тот же список для серверной фильтрации Tavily (include_domains)
+        self._include_domains = list(_RUSSIAN_DOMAINS)
+
+    def _is_russian_host(self, url: str) -> bool:
+        """Проверяет хост URL по списку русскоязычных доменов (по суффиксам)"""
+        host = urlsplit(url).hostname or ""
+        while host:
+            if host in self._domain_suffixes:
+                return True
+            host = host.partition('.')[2]
+        return False
+
+    def initialize(self, api_key: str, semantic_cache: bool = True):
         """Инициализация клиента Tavily"""
         self.client = TavilyClient(api_key=api_key)
+        self._load_state()
         logger.info("✅ Tavily клиент инициализирован")
+        if semantic_cache:
+            self._load_embedder()
+
+    def _load_state(self):
+        """Восстанавливает счётчики квоты с диска"""
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+            last_reset = datetime.fromisoformat(state["last_reset"])
+            # Счётчики прошлого месяца/дня не тащим — их обнулит _check_limits
+            if last_reset.month == datetime.now().month:
+                self.monthly_queries = state["monthly_queries"]
+                self.last_reset = last_reset
+                self._last_reset_month = last_reset.month
+                if state.get("last_day") == str(self.last_day):
+                    self.daily_queries = state.get("daily_queries", 0)
+            logger.info(f"💾 Квота Tavily восстановлена: {self.monthly_queries}/{self.max_monthly}")
+        except FileNotFoundError:
+            pass
+        except (KeyError, ValueError, OSError) as e:
+            logger.warning(f"⚠️ Не удалось прочитать состояние квоты: {e}")
+
+    def _save_state(self):
+        """Атомарно сбрасывает счётчики квоты на диск"""
+        try:
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    "monthly_queries": self.monthly_queries,
+                    "last_reset": self.last_reset.isoformat(),
+                    "daily_queries": self.daily_queries,
+                    "last_day": str(self.last_day)
+                }, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            # Запись состояния не должна ломать сам запрос
+            logger.warning(f"⚠️ Не удалось сохранить состояние квоты: {e}")
+
+    def _load_embedder(self):
+        """Подгружает модель эмбеддингов, если она доступна"""
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            logger.info("ℹ️ sentence-transformers не установлен — семантический кэш отключён")
+            return
+        # Мультиязычная модель — русские запросы должны работать
+        self._embedder = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
+        logger.info("🧠 Семантический кэш запросов включён")
+
+    async def _embed(self, text: str):
+        """Эмбеддинг текста; ждущие одновременно запросы кодируются пачкой"""
+        fut = asyncio.get_event_loop().create_future()
+        self._embed_pending.append((text, fut))
+        async with self._embed_lock:
+            if fut.done():
+                # Наш текст уже закодировал держатель блокировки до нас
+                return fut.result()
+            batch = self._embed_pending
+            self._embed_pending = []
+            texts = [t for t, _ in batch]
+            try:
+                embeddings = await asyncio.to_thread(
+                    self._embedder.encode, texts,
+                    normalize_embeddings=True, batch_size=32
+                )
+            except Exception as e:
+                for _, f in batch:
+                    if not f.done():
+                        f.set_exception(e)
+                raise
+            for (_, f), emb in zip(batch, embeddings):
+                if not f.done():
+                    f.set_result(emb)
+            return fut.result()
+
+    async def _semantic_lookup(self, key: tuple):
+        """
+        Ищет семантически близкий закэшированный запрос
+
+        Returns:
+            (эмбеддинг запроса, ключ найденной записи или None)
+        """
+        q_emb = await self._embed(key[0])
+        best_key = None
+        best_sim = self._sem_threshold
+        alive = []
+        for emb, k in self._sem_entries:
+            if k not in self._cache:
+                continue  # Запись протухла — выбрасываем и из индекса
+            alive.append((emb, k))
+            if k[1:] != key[1:]:
+                continue  # Сравниваем только одинаковые topic/параметры
+            sim = float(emb @ q_emb)
+            if sim >= best_sim:
+                best_sim = sim
+                best_key = k
+        self._sem_entries = alive
+        return q_emb, best_key
     
     def _check_limits(self) -> bool:
-        """Проверка месячного лимита"""
-        if datetime.now().month != self.last_reset.month:
+        """Проверка лимитов: месяц, день и скользящее окно в минуту"""
+        now = datetime.now()
+        if now.month != self._last_reset_month:
             self.monthly_queries = 0
-            self.last_reset = datetime.now()
-        
+            self.last_reset = now
+            self._last_reset_month = now.month
+        if now.date() != self.last_day:
+            self.daily_queries = 0
+            self.last_day = now.date()
+
         if self.monthly_queries >= self.max_monthly:
             logger.warning(f"⚠️ Месячный лимит Tavily исчерпан ({self.max_monthly})")
             return False
+
+        daily_limit = self.max_monthly * self.daily_peak_days // 30
+        if self.daily_queries >= daily_limit:
+            logger.warning(f"⚠️ Дневной лимит Tavily исчерпан ({daily_limit})")
+            return False
+
+        cutoff = time.monotonic() - 60
+        while self.minute_bucket and self.minute_bucket[0] < cutoff:
+            self.minute_bucket.popleft()
+        if len(self.minute_bucket) >= self.max_per_minute:
+            logger.warning(f"⚠️ Слишком много запросов Tavily за минуту ({self.max_per_minute})")
+            return False
         return True
+
+    async def _client_search(self, **kwargs) -> Dict:
+        """
+        Вызов self.client.search в потоке с ретраем транзиентных сбоев
+
+        Обрыв соединения, таймаут и 502/503/504 повторяются до трёх раз
+        с экспоненциальной паузой (0.5/1.0 c) — пользователь получает
+        ответ через ~1.5 c вместо ошибки и ручного повтора. Остальные
+        ошибки (4xx, неверный ключ) пробрасываются сразу.
+        """
+        attempts = 3
+        for attempt in range(attempts):
+            try:
+                return await asyncio.to_thread(self.client.search, **kwargs)
+            except _HTTP_STATUS_EXC as e:
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                if attempt == attempts - 1 or status not in (502, 503, 504):
+                    raise
+            except _TRANSIENT_EXC:
+                if attempt == attempts - 1:
+                    raise
+            delay = 0.5 * 2 ** attempt
+            logger.warning("⚠️ Транзиентная ошибка Tavily, повтор через %.1f c", delay)
+            await asyncio.sleep(delay)
+
+    def _note_query(self):
+        """Учитывает выполненный запрос во всех счётчиках лимитов"""
+        self.monthly_queries += 1
+        self.daily_queries += 1
+        self.minute_bucket.append(time.monotonic())
+        self._save_state()
     
     def _is_russian_result(self, result: Dict) -> bool:
         """Улучшенная проверка русскоязычности результата"""
-        title = result.get('title', '')
-        content = result.get('content', '')
-        url = result.get('url', '').lower()
-        
-        # 1. Проверка по домену (самый надежный способ)
-        for domain in self.russian_domains:
-            if domain in url:
-                logger.debug(f"✅ Русский домен: {domain} в {url}")
+        # 0. Быстрый путь: хост на .ru/.рф/.su — русский без lower(),
+        # urlsplit и прочей работы (TLD в ответах Tavily уже в нижнем
+        # регистре). Хост выделяем вручную, а не подстрокой '.ru/' по
+        # всему URL — иначе ловили бы пути вида evil.com/x.ru/
+        raw_url = result.get('url', '')
+        scheme_end = raw_url.find('://')
+        if scheme_end != -1:
+            host_start = scheme_end + 3
+            slash = raw_url.find('/', host_start)
+            host = raw_url[host_start:] if slash == -1 else raw_url[host_start:slash]
+            if host.endswith(('.ru', '.рф', '.su')):
                 return True
-        
+
+        # 1. Проверка по домену (самый надежный способ) — до того, как
+        # трогаем title/content: для большинства результатов на русский
+        # запрос текст вообще не понадобится.
+        # Приведённые к нижнему регистру строки кэшируем на самом dict,
+        # чтобы повторный вызов по тому же результату ничего не аллоцировал
+        url = result.get('_url_l')
+        if url is None:
+            url = result['_url_l'] = result.get('url', '').lower()
+        if self._is_russian_host(url):
+            logger.debug("✅ Русский домен: %s", url)
+            return True
+
         # 2. Проверка по наличию русских букв в тексте
+        title = result.get('title', '')
+        content = result.get('content', '')
         text = (title + " " + content)[:1000]  # Первые 1000 символов
-        
-        # Считаем русские и английские буквы
-        russian_count = 0
-        english_count = 0
-        total_chars = 0
-        
-        for char in text:
-            if 'а' <= char.lower() <= 'я' or char.lower() in ['ё', 'ъ', 'ы', 'э']:
-                russian_count += 1
-            elif 'a' <= char.lower() <= 'z':
-                english_count += 1
-            total_chars += 1
-        
+
         # Если текст слишком короткий, не можем определить
+        total_chars = len(text)
         if total_chars < 20:
             return False
-        
+
+        # Считаем русские и английские буквы: один C-проход translate
+        # вместо Python-цикла по каждому символу
+        marks = text.translate(_LANG_TABLE)
+        russian_count = marks.count('R')
+        english_count = marks.count('E')
+
         # Вычисляем процент русских букв
         russian_percent = russian_count / (russian_count + english_count + 1) * 100
-        
-        # 3. Проверка по словам
-        text_lower = text.lower()
-        russian_word_count = 0
-        for word in self.russian_words:
-            if word in text_lower:
-                russian_word_count += 1
-        
-        # Принимаем решение
-        is_russian = (
-            russian_percent > 50 or  # Больше 50% русских букв
-            russian_word_count > 3    # Или найдено больше 3 русских слов
-        )
-        
+
+        if russian_percent > 50:  # Больше 50% русских букв — решено,
+            # text.lower() и сканирование слов не нужны
+            logger.debug("✅ Русский текст: %.1f%% русских букв", russian_percent)
+            return True
+
+        # 3. Проверка по словам: один проход finditer, считаем различные
+        # слова и выходим, как только порог (>3) достигнут
+        text_lower = result.get('_text_l')
+        if text_lower is None:
+            text_lower = result['_text_l'] = text.lower()
+        seen_words = set()
+        for m in self._words_re.finditer(text_lower):
+            seen_words.add(m.group())
+            if len(seen_words) > 3:
+                break
+        russian_word_count = len(seen_words)
+
+        # Найдено больше 3 русских слов?
+        is_russian = russian_word_count > 3
+
         if is_russian:
-            logger.debug(f"✅ Русский текст: {russian_percent:.1f}% русских букв, {russian_word_count} русских слов")
+            logger.debug("✅ Русский текст: %.1f%% русских букв, %d русских слов",
+                         russian_percent, russian_word_count)
         else:
-            logger.debug(f"❌ Не русский текст: {russian_percent:.1f}% русских букв, {russian_word_count} русских слов")
+            logger.debug("❌ Не русский текст: %.1f%% русских букв, %d русских слов",
+                         russian_percent, russian_word_count)
         
         return is_russian
     
-    async def search(self, query: str, max_results: int = 5, topic: str = "general") -> Dict:
+    def _cache_get(self, key: tuple) -> Optional[Dict]:
+        """Возвращает закэшированный ответ, если он ещё не протух"""
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        ts, response = entry
+        if time.monotonic() - ts > self._cache_ttl:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return response
+
+    def _cache_put(self, key: tuple, response: Dict):
+        self._cache[key] = (time.monotonic(), response)
+        while len(self._cache) > self._cache_max:
+            self._cache.popitem(last=False)
+
+    async def _cached_call(self, key: tuple, upstream, *args,
+                           bypass_cache: bool = False) -> Dict:
+        """Обёртка: кэш ответов + склейка одинаковых запросов в полёте"""
+        q_emb = None
+        if not bypass_cache:
+            cached = self._cache_get(key)
+            if cached is not None:
+                logger.info(f"♻️ Tavily кэш-попадание: {key[0][:60]}")
+                # Поверхностная копия с пометкой, что ответ из кэша
+                response = copy.copy(cached)
+                response["cache"] = "HIT"
+                return response
+
+            if self._embedder is not None:
+                q_emb, sem_key = await self._semantic_lookup(key)
+                if sem_key is not None:
+                    cached = self._cache_get(sem_key)
+                    if cached is not None:
+                        logger.info(f"♻️ Tavily семантическое попадание: {key[0][:60]}")
+                        response = copy.copy(cached)
+                        response["cache"] = "HIT-SEMANTIC"
+                        return response
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            # Такой же запрос уже выполняется — ждём его результат.
+            # shield: отмена одного ожидающего не должна ронять общий future
+            return await asyncio.shield(inflight)
+
+        fut = asyncio.get_event_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            response = await upstream(*args)
+            if "error" not in response:
+                self._cache_put(key, response)
+                if q_emb is not None:
+                    self._sem_entries.append((q_emb, key))
+                    if len(self._sem_entries) > self._sem_max:
+                        del self._sem_entries[0]
+            fut.set_result(response)
+            return response
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # Не ругаться в лог, если никто не ждал
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def search(self, query: str, max_results: int = 5, topic: str = "general",
+                     bypass_cache: bool = False, include_answer: bool = True,
+                     include_domains: Optional[list] = None) -> Dict:
+        """
+        Поиск через Tavily (с кэшем и дедупликацией одинаковых запросов)
+
+        include_answer: запрашивать ли сводку-ответ от Tavily. Ответ раздувает
+        тело HTTP-ответа на десятки килобайт; вызывающим, которым нужны только
+        ссылки, стоит передать False. При max_results >= 10 выключается
+        автоматически — столько результатов просят для списков, не для сводки.
+        include_domains: переопределяет серверный фильтр доменов (по умолчанию
+        список русских доменов при filter_russian).
+        """
+        if max_results >= 10:
+            include_answer = False
+        # Нормализуем запрос, чтобы "Погода" и "погода " попадали в один ключ
+        key = (query.strip().lower(), topic, max_results, include_answer,
+               tuple(include_domains) if include_domains else None)
+        return await self._cached_call(key, self._search_upstream,
+                                       query, max_results, topic,
+                                       include_answer, include_domains,
+                                       bypass_cache=bypass_cache)
+
+    async def search_news(self, query: str, days: int = 7, max_results: int = 5,
+                          bypass_cache: bool = False) -> Dict:
+        """Поиск новостей через Tavily (с кэшем и дедупликацией)"""
+        key = (query.strip().lower(), "news", max_results, days)
+        return await self._cached_call(key, self._search_news_upstream,
+                                       query, days, max_results,
+                                       bypass_cache=bypass_cache)
+
+    def _classify_results(self, results: List[Dict], russian_results: list,
+                          other_results: list, with_dates: bool = False):
+        """Раскладывает результаты по языку, кэшируя вердикт (и дату) на них"""
+        for result in results:
+            is_ru = self._is_russian_result(result)
+            result['_is_ru'] = is_ru
+            if with_dates:
+                result['_pub_fmt'] = _format_pub_date(result.get('published_date', ''))
+            if is_ru:
+                russian_results.append(result)
+            else:
+                other_results.append(result)
+
+    async def _search_upstream(self, query: str, max_results: int = 5,
+                               topic: str = "general", include_answer: bool = True,
+                               include_domains: Optional[list] = None) -> Dict:
         """
         Выполняет поиск через Tavily с приоритетом русскоязычных результатов
         """
@@ -130,7 +527,7 @@ class TavilySearchEngine:
             return {"error": "Tavily клиент не инициализирован"}
         
         if not self._check_limits():
-            return {"error": "Месячный лимит запросов исчерпан"}
+            return {"error": "Лимит запросов исчерпан, попробуйте позже"}
         
         try:
             logger.info(f"🔍 Tavily поиск: {query[:100]}...")
@@ -138,31 +535,56 @@ class TavilySearchEngine:
             # Добавляем в запрос указание на русский язык
             enhanced_query = f"{query} -английский -english"
             
-            response = self.client.search(
+            # TavilyClient.search синхронный — уводим его в поток,
+            # чтобы не блокировать event loop на время HTTP-запроса
+            # Русскоязычный фильтр выполняет сам сервер (include_domains):
+            # меньше трафика и мусорных результатов; несоскоупленный
+            # добор ниже остаётся запасным вариантом
+            response = await self._client_search(
                 query=enhanced_query,
                 search_depth="advanced",
                 topic=topic,
-                max_results=max_results * 5,  # Запрашиваем больше для фильтрации
-                include_answer=True,
-                include_raw_content=False
+                max_results=max_results,
+                include_answer=include_answer,
+                include_raw_content=False,
+                include_domains=include_domains if include_domains is not None
+                    else (self._include_domains if self.filter_russian else None)
             )
             
-            self.monthly_queries += 1
-            remaining = self.max_monthly - self.monthly_queries
+            self._note_query()
             
             # Фильтруем результаты
             all_results = response.get('results', [])
             russian_results = []
             other_results = []
-            
-            for result in all_results:
-                if self._is_russian_result(result):
-                    russian_results.append(result)
-                else:
-                    other_results.append(result)
+            self._classify_results(all_results, russian_results, other_results)
+
+            # Добор: избыточную выдачу просим только если русских
+            # результатов не хватило (обычно верхушка уже русскоязычная)
+            if (self.filter_russian and len(russian_results) < max_results
+                    and self._check_limits()):
+                topup = await self._client_search(
+                    query=enhanced_query,
+                    search_depth="advanced",
+                    topic=topic,
+                    max_results=max_results * 4,
+                    include_answer=False,
+                    include_raw_content=False
+                )
+                self._note_query()
+                seen_urls = {r.get('url') for r in all_results}
+                extra = [r for r in topup.get('results', [])
+                         if r.get('url') not in seen_urls]
+                all_results = all_results + extra
+                self._classify_results(extra, russian_results, other_results)
+
+            remaining = self.max_monthly - self.monthly_queries
             
             # Берем русские результаты, если есть, иначе английские
-            if len(russian_results) >= max_results:
+            if not self.filter_russian:
+                final_results = all_results[:max_results]
+                used_russian = True
+            elif len(russian_results) >= max_results:
                 final_results = russian_results[:max_results]
                 used_russian = True
             elif russian_results:
@@ -186,7 +608,7 @@ class TavilySearchEngine:
             logger.error(f"❌ Ошибка Tavily поиска: {e}")
             return {"error": str(e)}
     
-    async def search_news(self, query: str, days: int = 7, max_results: int = 5) -> Dict:
+    async def _search_news_upstream(self, query: str, days: int = 7, max_results: int = 5) -> Dict:
         """
         Поиск новостей через Tavily с приоритетом русскоязычных источников
         """
@@ -194,7 +616,7 @@ class TavilySearchEngine:
             return {"error": "Tavily клиент не инициализирован"}
         
         if not self._check_limits():
-            return {"error": "Месячный лимит запросов исчерпан"}
+            return {"error": "Лимит запросов исчерпан, попробуйте позже"}
         
         try:
             logger.info(f"📰 Tavily поиск новостей: {query[:100]}...")
@@ -202,32 +624,55 @@ class TavilySearchEngine:
             # Добавляем в запрос указание на русский язык
             enhanced_query = f"{query} -английский -english -uk -us -gb"
             
-            response = self.client.search(
+            # См. search: синхронный клиент уходит в поток
+            # См. _search_upstream: первый запрос скоупим по доменам
+            response = await self._client_search(
                 query=enhanced_query,
                 search_depth="advanced",
                 topic="news",
-                max_results=max_results * 5,
+                max_results=max_results,
                 include_answer=False,
                 include_raw_content=False,
-                days=days
+                days=days,
+                include_domains=self._include_domains if self.filter_russian else None
             )
             
-            self.monthly_queries += 1
-            remaining = self.max_monthly - self.monthly_queries
+            self._note_query()
             
             # Фильтруем результаты
             all_results = response.get('results', [])
             russian_results = []
             other_results = []
-            
-            for result in all_results:
-                if self._is_russian_result(result):
-                    russian_results.append(result)
-                else:
-                    other_results.append(result)
+            self._classify_results(all_results, russian_results, other_results,
+                                   with_dates=True)
+
+            # Добор — см. _search_upstream
+            if (self.filter_russian and len(russian_results) < max_results
+                    and self._check_limits()):
+                topup = await self._client_search(
+                    query=enhanced_query,
+                    search_depth="advanced",
+                    topic="news",
+                    max_results=max_results * 4,
+                    include_answer=False,
+                    include_raw_content=False,
+                    days=days
+                )
+                self._note_query()
+                seen_urls = {r.get('url') for r in all_results}
+                extra = [r for r in topup.get('results', [])
+                         if r.get('url') not in seen_urls]
+                all_results = all_results + extra
+                self._classify_results(extra, russian_results, other_results,
+                                       with_dates=True)
+
+            remaining = self.max_monthly - self.monthly_queries
             
             # Берем русские результаты, если есть
-            if len(russian_results) >= max_results:
+            if not self.filter_russian:
+                final_results = all_results[:max_results]
+                used_russian = True
+            elif len(russian_results) >= max_results:
                 final_results = russian_results[:max_results]
                 used_russian = True
             elif russian_results:
@@ -251,6 +696,17 @@ class TavilySearchEngine:
             logger.error(f"❌ Ошибка Tavily поиска новостей: {e}")
             return {"error": str(e)}
     
+    def _format_cache_get(self, key: tuple) -> Optional[str]:
+        cached = self._format_cache.get(key)
+        if cached is not None:
+            self._format_cache.move_to_end(key)
+        return cached
+
+    def _format_cache_put(self, key: tuple, message: str):
+        self._format_cache[key] = message
+        while len(self._format_cache) > self._format_cache_max:
+            self._format_cache.popitem(last=False)
+
     def format_search_results(self, response: Dict) -> str:
         """Форматирует результаты поиска для отправки в чат"""
         if "error" in response:
@@ -264,36 +720,44 @@ class TavilySearchEngine:
         
         if not results and not answer:
             return f"🔍 По запросу '{query}' ничего не найдено."
-        
-        message = f"🔍 **Результаты поиска по запросу:**\n"
-        message += f"_{query}_\n\n"
-        
+
+        cache_key = ("search", query, answer, used_russian,
+                     tuple(r.get('url', '') for r in results))
+        cached = self._format_cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        # Куски сообщения собираем в список и склеиваем одним join
+        parts = [f"🔍 **Результаты поиска по запросу:**\n", f"_{query}_\n\n"]
+
         if not used_russian:
-            message += "⚠️ **Внимание:** Не найдено русскоязычных источников, показываю английские.\n\n"
-        
+            parts.append("⚠️ **Внимание:** Не найдено русскоязычных источников, показываю английские.\n\n")
+
         if answer and used_russian:
-            message += f"📌 **Краткий ответ:**\n{answer}\n\n"
-        
+            parts.append(f"📌 **Краткий ответ:**\n{answer}\n\n")
+
         if results:
             for i, result in enumerate(results, 1):
-                title = result.get('title', 'Без названия')
+                title = result.get('title', _TITLE_EMPTY)
                 content = result.get('content', '')
                 url = result.get('url', '')
-                
-                # Проверяем язык этого конкретного результата
-                is_russian = self._is_russian_result(result)
-                flag = "🇷🇺 " if is_russian else "🇬🇧 "
-                
-                message += f"**{i}. {flag}{title}**\n"
+
+                # Язык уже определён на этапе фильтрации
+                is_russian = result['_is_ru'] if '_is_ru' in result else self._is_russian_result(result)
+                flag = _FLAG_RU if is_russian else _FLAG_OTHER
+
+                parts.append(f"**{i}. {flag}{title}**\n")
                 if content:
                     content = content[:200] + "..." if len(content) > 200 else content
-                    message += f"{content}\n"
+                    parts.append(f"{content}\n")
                 if url:
-                    message += f"🔗 [Ссылка]({url})\n"
-                message += "\n"
-        
-        return message.strip()
-    
+                    parts.append(f"🔗 [Ссылка]({url})\n")
+                parts.append("\n")
+
+        message = "".join(parts).strip()
+        self._format_cache_put(cache_key, message)
+        return message
+
     def format_news_results(self, response: Dict) -> str:
         """Форматирует новости для отправки в чат"""
         if "error" in response:
@@ -306,41 +770,44 @@ class TavilySearchEngine:
         
         if not results:
             return f"📰 По запросу '{query}' новостей не найдено."
-        
-        message = f"📰 **Последние новости по запросу:**\n"
-        message += f"_{query}_\n\n"
-        
+
+        cache_key = ("news", query, used_russian, russian_found,
+                     tuple(r.get('url', '') for r in results))
+        cached = self._format_cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        # Куски сообщения собираем в список и склеиваем одним join
+        parts = [f"📰 **Последние новости по запросу:**\n", f"_{query}_\n\n"]
+
         if not used_russian:
-            message += "⚠️ **Внимание:** Не найдено русскоязычных новостей, показываю английские.\n\n"
+            parts.append("⚠️ **Внимание:** Не найдено русскоязычных новостей, показываю английские.\n\n")
         else:
-            message += f"**Найдено {russian_found} русскоязычных новостей:**\n\n"
-        
+            parts.append(f"**Найдено {russian_found} русскоязычных новостей:**\n\n")
+
         for i, result in enumerate(results, 1):
-            title = result.get('title', 'Без названия')
+            title = result.get('title', _TITLE_EMPTY)
             content = result.get('content', '')
             url = result.get('url', '')
-            published = result.get('published_date', '')
-            
-            # Проверяем язык этого конкретного результата
-            is_russian = self._is_russian_result(result)
-            flag = "🇷🇺 " if is_russian else "🇬🇧 "
-            
-            message += f"**{i}. {flag}{title}**\n"
+            # Дата и язык уже определены на этапе фильтрации
+            published = result['_pub_fmt'] if '_pub_fmt' in result \
+                else _format_pub_date(result.get('published_date', ''))
+            is_russian = result['_is_ru'] if '_is_ru' in result else self._is_russian_result(result)
+            flag = _FLAG_RU if is_russian else _FLAG_OTHER
+
+            parts.append(f"**{i}. {flag}{title}**\n")
             if content:
-                message += f"{content[:150]}...\n"
+                parts.append(f"{content[:150]}...\n")
             if published:
-                try:
-                    pub_date = datetime.fromisoformat(published.replace('Z', '+00:00'))
-                    published = pub_date.strftime("%d.%m.%Y %H:%M")
-                except:
-                    published = published[:10]
-                message += f"📅 {published}\n"
+                parts.append(f"📅 {published}\n")
             if url:
-                message += f"🔗 [Читать]({url})\n"
-            message += "\n"
-        
-        return message.strip()
-    
+                parts.append(f"🔗 [Читать]({url})\n")
+            parts.append("\n")
+
+        message = "".join(parts).strip()
+        self._format_cache_put(cache_key, message)
+        return message
+
     def get_limits_status(self) -> str:
         """Возвращает статус использования лимитов"""
         remaining = self.max_monthly - self.monthly_queries